@@ -1,5 +1,5 @@
 # app.py - COMPLETE OPENAI API INTEGRATION FOR ALL FUNCTIONALITIES
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 import PyPDF2
@@ -7,9 +7,32 @@ import docx
 import openai
 import json
 import re
+import gzip
+import hashlib
+import io
 import logging
+import math
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+# Optional fast-path dependencies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
@@ -21,6 +44,79 @@ logger = logging.getLogger(__name__)
 # Initialize OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# Response pipeline settings
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '86400'))
+SUPPORTED_ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+# Cached results together with their serialized (and precompressed) bytes
+response_cache = OrderedDict()
+response_cache_lock = threading.Lock()
+
+# Adaptive completion sizes, learned per endpoint and per bucket (career, difficulty, ...)
+ADAPTIVE_TOKENS_PERCENTILE = float(os.getenv('ADAPTIVE_TOKENS_PERCENTILE', '95'))
+ADAPTIVE_TOKENS_MARGIN = float(os.getenv('ADAPTIVE_TOKENS_MARGIN', '1.2'))
+ADAPTIVE_TOKENS_MIN_SAMPLES = int(os.getenv('ADAPTIVE_TOKENS_MIN_SAMPLES', '20'))
+ADAPTIVE_TOKENS_SAMPLE_SIZE = int(os.getenv('ADAPTIVE_TOKENS_SAMPLE_SIZE', '200'))
+MIN_COMPLETION_TOKENS = 64
+MAX_COMPLETION_TOKENS = int(os.getenv('MAX_COMPLETION_TOKENS', '4000'))
+OPENAI_REQUEST_TIMEOUT_SECONDS = float(os.getenv('OPENAI_REQUEST_TIMEOUT_SECONDS', '60'))
+completion_stats = {}
+completion_stats_lock = threading.Lock()
+
+# Dashboard insights change detection
+INSIGHTS_MODULES_DELTA = int(os.getenv('INSIGHTS_MODULES_DELTA', '1'))
+INSIGHTS_PERCENT_DELTA = float(os.getenv('INSIGHTS_PERCENT_DELTA', '5'))
+INSIGHTS_MAX_AGE_SECONDS = int(os.getenv('INSIGHTS_MAX_AGE_SECONDS', '86400'))
+INSIGHTS_STORE_SIZE = int(os.getenv('INSIGHTS_STORE_SIZE', '10000'))
+# Progress fields compared against INSIGHTS_PERCENT_DELTA: names with these suffixes and every value in these groups
+PERCENTAGE_FIELD_SUFFIXES = ('percent', 'percentage', 'rate', 'fraction', 'ratio', 'progress')
+PERCENTAGE_PROGRESS_GROUPS = ('skill_progress', 'skills')
+FRACTION_FIELD_SUFFIXES = ('rate', 'fraction', 'ratio', 'progress')
+INSIGHTS_LLM_MOTIVATION = os.getenv('INSIGHTS_LLM_MOTIVATION', 'false').lower() == 'true'
+
+# Last generated insights per user, with the input they were generated from
+insights_store = OrderedDict()
+insights_store_lock = threading.Lock()
+
+# Bulk CV analysis settings
+CV_EXTENSIONS = ('.pdf', '.docx', '.txt')
+BULK_MAX_FILES = int(os.getenv('BULK_MAX_FILES', '500'))
+BULK_MAX_TOTAL_BYTES = int(os.getenv('BULK_MAX_TOTAL_BYTES', str(200 * 1024 * 1024)))
+BULK_EXTRACT_WORKERS = int(os.getenv('BULK_EXTRACT_WORKERS', str(os.cpu_count() or 2)))
+BULK_LLM_CONCURRENCY = int(os.getenv('BULK_LLM_CONCURRENCY', '8'))
+BULK_EXTRACT_TIMEOUT_SECONDS = float(os.getenv('BULK_EXTRACT_TIMEOUT_SECONDS', '30'))
+BULK_RESULT_TIMEOUT_SECONDS = float(os.getenv('BULK_RESULT_TIMEOUT_SECONDS', '180'))
+
+# Curated learning-resource catalog, indexed by normalized skill on first use
+RESOURCE_CATALOG_PATH = os.getenv('RESOURCE_CATALOG_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources.jsonl'))
+RESOURCES_PER_MODULE = int(os.getenv('RESOURCES_PER_MODULE', '3'))
+DIFFICULTY_LEVELS = ['beginner', 'intermediate', 'advanced']
+resource_catalog = None
+resource_catalog_lock = threading.Lock()
+
+# Lesson sections, generated on demand and cached independently
+LESSON_SECTIONS = [
+    ('theory', 'Theory and Concepts'),
+    ('code_examples', 'Code Examples'),
+    ('common_mistakes', 'Common Mistakes'),
+    ('exercises', 'Practice Exercises'),
+    ('applications', 'Real-World Applications')
+]
+LESSON_SECTION_WORKERS = int(os.getenv('LESSON_SECTION_WORKERS', '4'))
+LESSON_SECTION_WAIT_SECONDS = float(os.getenv('LESSON_SECTION_WAIT_SECONDS', '90'))
+# Prefetch only, never more prefetches than workers so nothing queues behind them
+lesson_section_pool = ThreadPoolExecutor(max_workers=LESSON_SECTION_WORKERS)
+lesson_prefetch_slots = threading.BoundedSemaphore(LESSON_SECTION_WORKERS)
+lesson_sections_in_flight = {}
+lesson_sections_lock = threading.Lock()
+
+# Shared process pool for CV text extraction, created on first bulk request
+extraction_pool = None
+extraction_pool_lock = threading.Lock()
+
 # Career configurations
 CAREER_CONFIGS = {
     'fullstack': {
@@ -67,6 +163,87 @@ CAREER_CONFIGS = {
     }
 }
 
+# Skill prerequisite graph used by the local roadmap scheduler
+SKILL_PREREQUISITES = {
+    'HTML/CSS': [],
+    'JavaScript': [],
+    'TypeScript': ['JavaScript'],
+    'React': ['JavaScript', 'HTML/CSS'],
+    'Node.js': ['JavaScript'],
+    'UI/UX': ['HTML/CSS'],
+    'SQL': [],
+    'Database': ['SQL'],
+    'APIs': ['Database'],
+    'Authentication': ['APIs'],
+    'Python': [],
+    'Java': [],
+    'C#': [],
+    'C++': [],
+    'R': [],
+    'Statistics': ['Python'],
+    'Data Visualization': ['Statistics'],
+    'Machine Learning': ['Statistics', 'Python'],
+    'Deep Learning': ['Machine Learning'],
+    'TensorFlow': ['Deep Learning'],
+    'Data Engineering': ['Python', 'SQL'],
+    'React Native': ['React'],
+    'Swift': [],
+    'Kotlin': [],
+    'Mobile UI': [],
+    'Linux': [],
+    'Bash': ['Linux'],
+    'Docker': ['Linux'],
+    'Kubernetes': ['Docker'],
+    'AWS': ['Linux'],
+    'CI/CD': ['Docker']
+}
+
+# Estimated learning hours per skill module
+SKILL_HOURS = {
+    'HTML/CSS': 30,
+    'JavaScript': 60,
+    'TypeScript': 30,
+    'React': 60,
+    'Node.js': 45,
+    'UI/UX': 30,
+    'SQL': 30,
+    'Database': 30,
+    'APIs': 30,
+    'Authentication': 20,
+    'Python': 60,
+    'Java': 75,
+    'C#': 75,
+    'C++': 90,
+    'R': 45,
+    'Statistics': 45,
+    'Data Visualization': 30,
+    'Machine Learning': 90,
+    'Deep Learning': 75,
+    'TensorFlow': 45,
+    'Data Engineering': 60,
+    'React Native': 60,
+    'Swift': 60,
+    'Kotlin': 60,
+    'Mobile UI': 30,
+    'Linux': 30,
+    'Bash': 20,
+    'Docker': 30,
+    'Kubernetes': 45,
+    'AWS': 60,
+    'CI/CD': 30
+}
+DEFAULT_SKILL_HOURS = 45
+WEEKLY_COMMITMENT_HOURS = 15
+
+# Share of a module still needed when the user already has the skill at this level
+SKILL_LEVEL_REMAINING = {
+    'beginner': 0.5,
+    'intermediate': 0.0,
+    'advanced': 0.0
+}
+
+PHASE_TITLES = ['Foundations', 'Core Skills', 'Applied Skills', 'Advanced Topics', 'Specialization']
+
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -74,6 +251,30 @@ def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
 
+@app.route('/api/metrics/llm', methods=['GET'])
+def get_llm_metrics():
+    """Output-length, truncation and latency statistics per OpenAI endpoint"""
+    metrics = {}
+    with completion_stats_lock:
+        keys = list(completion_stats)
+        snapshot = {key: dict(completion_stats[key], samples=sorted(completion_stats[key]['samples'])) for key in keys}
+
+    for key, stats in snapshot.items():
+        samples = stats['samples']
+        endpoint, _, bucket = key.partition(':')
+        metrics[key] = {
+            'calls': stats['calls'],
+            'truncation_rate': round(stats['truncated'] / stats['calls'], 3) if stats['calls'] else 0,
+            'failed_after_retry': stats['failed_after_retry'],
+            'avg_latency_seconds': round(stats['total_latency'] / stats['calls'], 3) if stats['calls'] else 0,
+            'p50_completion_tokens': samples[len(samples) // 2] if samples else None,
+            'p95_completion_tokens': samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else None,
+            'current_max_tokens': choose_max_tokens(endpoint, bucket or None, None)
+        }
+
+    return jsonify({'endpoints': metrics})
+
+
 @app.route('/api/careers/list', methods=['GET'])
 def get_career_list():
     """Get list of available careers"""
@@ -139,8 +340,8 @@ def analyze_skills():
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
 
-def generate_ai_cv_analysis(cv_text: str, target_career: str) -> Dict[str, Any]:
-    """Generate comprehensive CV analysis using OpenAI"""
+def generate_ai_cv_analysis(cv_text: str, target_career: str, raise_errors: bool = False) -> Dict[str, Any]:
+    """Generate comprehensive CV analysis using OpenAI, or the fallback analysis unless raise_errors is set"""
     try:
         career_config = CAREER_CONFIGS.get(target_career, CAREER_CONFIGS['fullstack'])
 
@@ -200,8 +401,8 @@ def generate_ai_cv_analysis(cv_text: str, target_career: str) -> Dict[str, Any]:
         Be realistic, specific, and actionable. Focus on practical skills that can be learned.
         """
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        result_text = create_chat_completion(
+            'cv_analysis',
             messages=[
                 {
                     "role": "system",
@@ -213,10 +414,10 @@ def generate_ai_cv_analysis(cv_text: str, target_career: str) -> Dict[str, Any]:
                 }
             ],
             temperature=0.3,
-            max_tokens=2000
+            max_tokens=2000,
+            bucket=career_bucket(target_career)
         )
 
-        result_text = response.choices[0].message.content.strip()
         result_text = clean_json_response(result_text)
         analysis_data = json.loads(result_text)
 
@@ -225,9 +426,217 @@ def generate_ai_cv_analysis(cv_text: str, target_career: str) -> Dict[str, Any]:
 
     except Exception as e:
         logger.error(f"OpenAI CV analysis failed: {str(e)}")
+        if raise_errors:
+            raise
         return generate_fallback_analysis(target_career)
 
 
+@app.route('/api/skills/analyze-bulk', methods=['POST'])
+def analyze_skills_bulk():
+    """Bulk CV analysis streamed as newline-delimited JSON"""
+    try:
+        target_career = request.form.get('target_career', '')
+        if not target_career:
+            return jsonify({'error': 'No target career selected'}), 400
+
+        documents = read_bulk_documents(request.files.getlist('cvs') + request.files.getlist('archive'))
+
+        if not documents:
+            return jsonify({'error': 'No CV files uploaded'}), 400
+
+        logger.info(f"Processing {len(documents)} CVs in bulk for career: {target_career}")
+
+        return Response(
+            stream_with_context(stream_bulk_analysis(documents, target_career)),
+            mimetype='application/x-ndjson'
+        )
+
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Invalid zip archive'}), 400
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        logger.error(f"Bulk CV analysis failed: {str(e)}")
+        return jsonify({'error': f'Bulk analysis failed: {str(e)}'}), 500
+
+
+def read_bulk_documents(files: List) -> List[tuple]:
+    """Read uploaded CVs and zip archives into (filename, content) pairs"""
+    documents = []
+    total_size = 0
+
+    def check_limits(size: int):
+        if len(documents) >= BULK_MAX_FILES:
+            raise ValueError(f'Too many files, the limit is {BULK_MAX_FILES}')
+        if total_size + size > BULK_MAX_TOTAL_BYTES:
+            raise ValueError('Upload too large')
+
+    for file in files:
+        if not file.filename:
+            continue
+
+        if file.filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(CV_EXTENSIONS):
+                        continue
+                    # Skip macOS resource-fork metadata, which is not a CV
+                    if info.filename.startswith('__MACOSX/') or os.path.basename(info.filename).startswith('._'):
+                        continue
+                    # Check the declared size before decompressing anything
+                    check_limits(info.file_size)
+                    content = archive.read(info)
+                    total_size += len(content)
+                    documents.append((info.filename, content))
+        else:
+            content = file.read()
+            check_limits(len(content))
+            total_size += len(content)
+            documents.append((file.filename, content))
+
+    return documents
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Return the shared extraction process pool, creating it on first use"""
+    global extraction_pool
+    with extraction_pool_lock:
+        if extraction_pool is None:
+            # Forking a multithreaded server can copy held locks into the workers, so start them cleanly
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            extraction_pool = ProcessPoolExecutor(max_workers=BULK_EXTRACT_WORKERS,
+                                                  mp_context=multiprocessing.get_context(start_method))
+        return extraction_pool
+
+
+def reset_extraction_pool():
+    """Drop a broken extraction pool so the next request creates a fresh one"""
+    global extraction_pool
+    with extraction_pool_lock:
+        if extraction_pool is not None:
+            extraction_pool.shutdown(wait=False, cancel_futures=True)
+            extraction_pool = None
+
+
+def extract_text_with_timeout(filename: str, content: bytes, timeout: float) -> str:
+    """Extract text in a pool worker, interrupting a parse that runs longer than timeout seconds"""
+    if not hasattr(signal, 'SIGALRM'):
+        return extract_text_from_bytes(filename, content)
+
+    def on_timeout(signum, frame):
+        raise TimeoutError(f'Text extraction took longer than {timeout:g} seconds')
+
+    # Pool workers run tasks on their main thread, so the alarm interrupts only this file
+    previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return extract_text_from_bytes(filename, content)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def bulk_failure_result(index: int, filename: str, target_career: str, error: str) -> Dict[str, Any]:
+    """Fallback result line for a CV that could not be analyzed"""
+    return {
+        'index': index,
+        'filename': filename,
+        'target_career': target_career,
+        'analysis': generate_fallback_analysis(target_career),
+        'success': False,
+        'error': error
+    }
+
+
+def analyze_bulk_document(index: int, filename: str, cv_text: str, target_career: str) -> Dict[str, Any]:
+    """Analyze one extracted CV, falling back per file on any failure"""
+    try:
+        if not cv_text or len(cv_text.strip()) < 50:
+            raise ValueError('Could not extract meaningful text from CV')
+
+        return {
+            'index': index,
+            'filename': filename,
+            'target_career': target_career,
+            'analysis': generate_ai_cv_analysis(cv_text, target_career, raise_errors=True),
+            'success': True
+        }
+
+    except Exception as e:
+        logger.error(f"Bulk CV analysis failed for {filename}: {str(e)}")
+        return bulk_failure_result(index, filename, target_career, str(e))
+
+
+def stream_bulk_analysis(documents: List[tuple], target_career: str):
+    """Pipeline extraction (process pool) into LLM analysis (bounded threads), yielding results as they finish"""
+    results = queue.Queue()
+    llm_pool = ThreadPoolExecutor(max_workers=BULK_LLM_CONCURRENCY)
+    extraction_futures = []
+
+    def submit_analysis(index, filename, cv_text):
+        try:
+            future = llm_pool.submit(analyze_bulk_document, index, filename, cv_text, target_career)
+        except RuntimeError:
+            # The stream already ended (client gone or timed out), nobody is waiting for this file
+            return
+        future.add_done_callback(lambda f: results.put(f.result()))
+
+    def on_extracted(index, filename, future):
+        if future.cancelled():
+            return
+        try:
+            cv_text = future.result()
+        except Exception as e:
+            logger.error(f"CV extraction failed for {filename}: {str(e)}")
+            results.put(bulk_failure_result(index, filename, target_career, f'Could not extract text from CV: {str(e)}'))
+            return
+        submit_analysis(index, filename, cv_text)
+
+    try:
+        for index, (filename, content) in enumerate(documents):
+            try:
+                future = get_extraction_pool().submit(extract_text_with_timeout, filename, content,
+                                                      BULK_EXTRACT_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.error(f"CV extraction could not be scheduled for {filename}: {str(e)}")
+                reset_extraction_pool()
+                results.put(bulk_failure_result(index, filename, target_career, 'Could not schedule text extraction'))
+                continue
+            future.add_done_callback(lambda f, i=index, name=filename: on_extracted(i, name, f))
+            extraction_futures.append(future)
+
+        failed = 0
+        pending = set(range(len(documents)))
+        while pending:
+            try:
+                result = results.get(timeout=BULK_RESULT_TIMEOUT_SECONDS)
+            except queue.Empty:
+                # Nothing finished for too long: report whatever is still outstanding instead of hanging the stream
+                logger.error(f"Bulk CV analysis timed out with {len(pending)} files outstanding")
+                for index in sorted(pending):
+                    failed += 1
+                    yield serialize_json(bulk_failure_result(index, documents[index][0], target_career,
+                                                             'Timed out')) + b'\n'
+                break
+
+            if result['index'] not in pending:
+                continue
+            pending.discard(result['index'])
+            if not result['success']:
+                failed += 1
+            yield serialize_json(result) + b'\n'
+
+        yield serialize_json({'done': True, 'total': len(documents), 'failed': failed}) + b'\n'
+
+    finally:
+        # Free the shared extraction pool for other batches when this stream ends early
+        for future in extraction_futures:
+            future.cancel()
+        llm_pool.shutdown(wait=False, cancel_futures=True)
+
+
 @app.route('/api/ai/generate-roadmap', methods=['POST'])
 def generate_roadmap():
     """Generate AI-powered learning roadmap using OpenAI"""
@@ -240,18 +649,44 @@ def generate_roadmap():
         user_name = data.get('user_name', 'Student')
         user_skills = data.get('user_skills', [])
         timeframe_weeks = data.get('timeframe_weeks', 24)
-
-        # Generate roadmap using OpenAI
-        roadmap_data = generate_ai_roadmap(career, experience_level, user_name, user_skills, timeframe_weeks)
-
-        if not roadmap_data:
-            roadmap_data = generate_fallback_roadmap(career, experience_level, user_name)
+        hours_per_week = data.get('hours_per_week', WEEKLY_COMMITMENT_HOURS)
+
+        cache_key = make_cache_key('roadmap', career, experience_level, user_name, user_skills, timeframe_weeks,
+                                   hours_per_week)
+        cached = get_cached_payload(cache_key)
+        if cached:
+            logger.info(f"Roadmap served from cache for {career}")
+            return json_response(cached=cached)
+
+        # Module content does not depend on the timeframe, so it is cached separately and only rescheduled
+        content_key = make_cache_key('roadmap_content', career, experience_level, user_name, user_skills)
+        cached_content = get_cached_payload(content_key)
+        if cached_content:
+            roadmap_data = cached_content['data']
+        else:
+            # Generate roadmap content using OpenAI
+            roadmap_data = generate_ai_roadmap(career, experience_level, user_name, user_skills)
+
+            if not roadmap_data:
+                # Not cached, so the next request retries OpenAI
+                roadmap_data = schedule_roadmap(
+                    generate_fallback_roadmap(career, experience_level, user_name, user_skills),
+                    timeframe_weeks, hours_per_week)
+                return json_response({
+                    "success": True,
+                    **roadmap_data
+                })
+
+            store_cached_payload(content_key, roadmap_data)
+
+        roadmap_data = schedule_roadmap(roadmap_data, timeframe_weeks, hours_per_week)
 
         logger.info(f"Roadmap generated successfully for {career}")
-        return jsonify({
+        cached = store_cached_payload(cache_key, {
             "success": True,
             **roadmap_data
         })
+        return json_response(cached=cached)
 
     except Exception as e:
         logger.error(f"Roadmap generation failed: {str(e)}")
@@ -261,82 +696,95 @@ def generate_roadmap():
         }), 500
 
 
-def generate_ai_roadmap(career: str, experience_level: str, user_name: str, user_skills: List, timeframe_weeks: int) -> \
-Dict[str, Any]:
-    """Generate learning roadmap using OpenAI"""
+@app.route('/api/ai/reschedule-roadmap', methods=['POST'])
+def reschedule_roadmap():
+    """Repack an existing roadmap into a new timeframe without calling OpenAI"""
+    try:
+        data = request.get_json()
+        roadmap = data.get('roadmap')
+
+        if not isinstance(roadmap, dict) or not isinstance(roadmap.get('phases'), list) or not roadmap['phases']:
+            return jsonify({"success": False, "error": "No roadmap provided"}), 400
+
+        timeframe_weeks = data.get('timeframe_weeks', roadmap.get('total_duration_weeks', 24))
+        hours_per_week = data.get('hours_per_week', roadmap.get('weekly_commitment_hours', WEEKLY_COMMITMENT_HOURS))
+
+        roadmap = skip_covered_modules(roadmap, data.get('user_skills', []))
+        roadmap_data = schedule_roadmap(roadmap, timeframe_weeks, hours_per_week)
+
+        return json_response({
+            "success": True,
+            **roadmap_data
+        })
+
+    except Exception as e:
+        logger.error(f"Roadmap rescheduling failed: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": f"Failed to reschedule roadmap: {str(e)}"
+        }), 500
+
+
+def generate_ai_roadmap(career: str, experience_level: str, user_name: str, user_skills: List) -> \
+Optional[Dict[str, Any]]:
+    """Generate learning roadmap content using OpenAI for a locally planned module sequence"""
     try:
         career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
+        plan = build_roadmap_plan(career, user_skills)
 
         skills_text = ", ".join(
             [skill.get('skill', '') for skill in user_skills]) if user_skills else "No specific skills identified"
 
+        plan_text = "\n".join(
+            f"        {phase['phase_id']} ({phase['title']}):\n" + "\n".join(
+                f"          - {module['module_id']}: {module['skill']} (~{module['estimated_hours']} hours, "
+                f"after: {', '.join(module['prerequisites']) or 'none'})"
+                for module in phase['modules'])
+            for phase in plan['phases'])
+
         prompt = f"""
-        Create a comprehensive, practical learning roadmap for {user_name}, a {experience_level} level learner who wants to become a {career_config['title']}.
+        Write the content for a practical learning roadmap for {user_name}, a {experience_level} level learner who wants to become a {career_config['title']}.
 
         CAREER TARGET: {career_config['title']}
         EXPERIENCE LEVEL: {experience_level}
         USER NAME: {user_name}
         EXISTING SKILLS: {skills_text}
-        TIMEFRAME: {timeframe_weeks} weeks
-        WEEKLY COMMITMENT: 15 hours per week
-        REQUIRED TECHNOLOGIES: {', '.join(career_config['skills'])}
-        PROGRAMMING LANGUAGES: {', '.join(career_config['languages'])}
-
-        Generate a structured, industry-relevant learning path with:
-
-        1. 4-6 learning phases with clear progression from fundamentals to advanced
-        2. Each phase should have 2-3 practical, project-based modules
-        3. Each module must include:
-           - Specific, actionable learning objectives
-           - Technical skills that will be acquired (focus on {career_config['skills']})
-           - Real-world applications and mini-projects
-           - Duration in weeks (1-4 weeks per module)
-           - 2-3 high-quality, FREE learning resources (tutorials, documentation, interactive platforms)
+
+        The phases and modules are already planned and ordered by prerequisites. Do not add, remove or reorder them:
+{plan_text}
+
+        For each phase provide a title, description, focus areas and learning objectives.
+        For each module provide:
+           - A specific, project-based title and description
+           - Technical skills that will be acquired
            - Clear, measurable learning outcomes
 
-        4. Include comprehensive career guidance:
+        Also include comprehensive career guidance:
            - Current job market analysis for {career_config['title']} roles
            - Realistic salary expectations for different experience levels
            - Specific portfolio project recommendations
            - Technical interview preparation topics
 
-        Focus on practical, hands-on learning. Include coding exercises, real projects, and industry best practices.
-
-        Return ONLY valid JSON in this exact structure:
+        Return ONLY valid JSON in this exact structure, keyed by the ids above:
         {{
             "overview": "Brief description of the learning path",
-            "total_duration_weeks": {timeframe_weeks},
-            "weekly_commitment_hours": 15,
             "readiness_score": 65,
-            "phases": [
-                {{
-                    "phase_id": "phase_1",
+            "phases": {{
+                "phase_1": {{
                     "title": "Phase title",
-                    "description": "Phase description", 
-                    "duration_weeks": 6,
+                    "description": "Phase description",
                     "focus_areas": ["Area 1", "Area 2"],
-                    "learning_objectives": ["Objective 1", "Objective 2"],
-                    "modules": [
-                        {{
-                            "module_id": "module_1_1",
-                            "title": "Module title",
-                            "description": "Module description",
-                            "duration_weeks": 3,
-                            "technical_skills": ["Skill 1", "Skill 2"],
-                            "learning_outcomes": ["Outcome 1", "Outcome 2"],
-                            "resources": [
-                                {{
-                                    "title": "Resource title",
-                                    "url": "https://real-website.com/path",
-                                    "type": "tutorial|course|documentation|project",
-                                    "free": true,
-                                    "description": "Brief description"
-                                }}
-                            ]
-                        }}
-                    ]
+                    "learning_objectives": ["Objective 1", "Objective 2"]
                 }}
-            ],
+            }},
+            "modules": {{
+                "module_1_1": {{
+                    "title": "Module title",
+                    "description": "Module description",
+                    "technical_skills": ["Skill 1", "Skill 2"],
+                    "learning_outcomes": ["Outcome 1", "Outcome 2"]
+                }}
+            }},
             "career_guidance": {{
                 "job_market_analysis": "Current market analysis",
                 "salary_expectations": "Salary ranges",
@@ -346,11 +794,11 @@ Dict[str, Any]:
         }}
 
         Make it practical, industry-relevant, and tailored for a {experience_level} level learner.
-        Include real resources from platforms like freeCodeCamp, MDN, official documentation, Coursera, Udemy free courses, and YouTube tutorials.
+        Do not include learning resources or URLs, they are added from a curated catalog.
         """
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        result_text = create_chat_completion(
+            'roadmap',
             messages=[
                 {
                     "role": "system",
@@ -362,12 +810,15 @@ Dict[str, Any]:
                 }
             ],
             temperature=0.7,
-            max_tokens=3000
+            max_tokens=3000,
+            bucket=f"{career_bucket(career)}:{level_bucket(experience_level)}"
         )
 
-        result_text = response.choices[0].message.content.strip()
         result_text = clean_json_response(result_text)
-        roadmap_data = json.loads(result_text)
+        content = json.loads(result_text)
+
+        roadmap_data = apply_roadmap_content(plan, content)
+        attach_module_resources(roadmap_data, experience_level, primary_language(career, user_skills))
 
         # Add career information
         roadmap_data['career'] = career
@@ -380,20 +831,355 @@ Dict[str, Any]:
         return None
 
 
+def normalize_skill(skill: str) -> str:
+    """Normalize a skill name for matching"""
+    return re.sub(r'\s+', ' ', str(skill)).strip().lower()
+
+
+def primary_language(career: str, user_skills: List) -> str:
+    """The career language to build on: one the user already knows, else the career's first language"""
+    career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
+    known = set(covered_skill_hours(user_skills))
+    for language in career_config['languages']:
+        if normalize_skill(language) in known:
+            return language
+    return career_config['languages'][0]
+
+
+def career_skill_graph(career: str, user_skills: Optional[List] = None) -> Dict[str, List[str]]:
+    """Prerequisite graph for a career's skills and one primary language, including transitive prerequisites"""
+    career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
+
+    # The career's languages are alternatives, so only one of them is seeded
+    graph = {}
+    pending = [primary_language(career, user_skills)] + list(career_config['skills'])
+    while pending:
+        skill = pending.pop(0)
+        if skill in graph:
+            continue
+        graph[skill] = SKILL_PREREQUISITES.get(skill, [])
+        pending.extend(graph[skill])
+    return graph
+
+
+def topological_skill_levels(graph: Dict[str, List[str]]) -> List[List[str]]:
+    """Group skills into levels where every skill comes after all of its prerequisites"""
+    remaining = {skill: set(prerequisites) & set(graph) for skill, prerequisites in graph.items()}
+    levels = []
+    while remaining:
+        # Keep the graph's insertion order within a level: languages first, then career skills
+        level = [skill for skill, prerequisites in remaining.items() if not prerequisites]
+        if not level:
+            raise ValueError(f"Cycle in skill prerequisites: {', '.join(remaining)}")
+        levels.append(level)
+        for skill in level:
+            del remaining[skill]
+        for prerequisites in remaining.values():
+            prerequisites.difference_update(level)
+    return levels
+
+
+def covered_skill_hours(user_skills: List) -> Dict[str, float]:
+    """Share of a skill's hours still needed, keyed by normalized skill, for skills the user already has"""
+    coverage = {}
+    for user_skill in user_skills or []:
+        name = user_skill.get('skill', '') if isinstance(user_skill, dict) else user_skill
+        level = user_skill.get('level', 'intermediate') if isinstance(user_skill, dict) else 'intermediate'
+        coverage[normalize_skill(name)] = SKILL_LEVEL_REMAINING.get(str(level).lower(), 0.0)
+    return coverage
+
+
+def build_roadmap_plan(career: str, user_skills: List) -> Dict[str, Any]:
+    """Order career modules by prerequisites, skipping skills the user already covers"""
+    graph = career_skill_graph(career, user_skills)
+    coverage = covered_skill_hours(user_skills)
+
+    phases = []
+    for level in topological_skill_levels(graph):
+        modules = []
+        for skill in level:
+            remaining = coverage.get(normalize_skill(skill), 1.0)
+            if remaining <= 0:
+                continue
+            phase_number = len(phases) + 1
+            modules.append({
+                "module_id": f"module_{phase_number}_{len(modules) + 1}",
+                "title": skill,
+                "skill": skill,
+                "prerequisites": graph[skill],
+                "base_hours": SKILL_HOURS.get(skill, DEFAULT_SKILL_HOURS),
+                "estimated_hours": round(SKILL_HOURS.get(skill, DEFAULT_SKILL_HOURS) * remaining),
+                "technical_skills": [skill]
+            })
+
+        if modules:
+            phase_number = len(phases) + 1
+            phases.append({
+                "phase_id": f"phase_{phase_number}",
+                "title": PHASE_TITLES[min(phase_number, len(PHASE_TITLES)) - 1],
+                "focus_areas": [module['skill'] for module in modules],
+                "modules": modules
+            })
+
+    return {"phases": phases}
+
+
+def apply_roadmap_content(plan: Dict[str, Any], content: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge LLM-written phase and module content into the local plan"""
+    phase_content = content.get('phases') or {}
+    module_content = content.get('modules') or {}
+
+    phases = []
+    for phase in plan['phases']:
+        # Planned ids, skills and hours always win over anything the model returns
+        phases.append({
+            **phase,
+            **(phase_content.get(phase['phase_id']) or {}),
+            "phase_id": phase['phase_id'],
+            "modules": [
+                {**module, **(module_content.get(module['module_id']) or {}),
+                 "module_id": module['module_id'], "skill": module['skill'],
+                 "prerequisites": module['prerequisites'], "base_hours": module['base_hours'],
+                 "estimated_hours": module['estimated_hours']}
+                for module in phase['modules']
+            ]
+        })
+
+    return {
+        "overview": content.get('overview', ''),
+        "readiness_score": content.get('readiness_score', 50),
+        "phases": phases,
+        "career_guidance": content.get('career_guidance', {})
+    }
+
+
+def skip_covered_modules(roadmap: Dict[str, Any], user_skills: List) -> Dict[str, Any]:
+    """Drop or shorten modules for skills the user already has"""
+    coverage = covered_skill_hours(user_skills)
+    if not coverage:
+        return roadmap
+
+    phases = []
+    for phase in roadmap.get('phases', []):
+        modules = []
+        for module in phase.get('modules', []):
+            remaining = coverage.get(normalize_skill(module.get('skill', module.get('title', ''))), 1.0)
+            if remaining <= 0:
+                continue
+            if remaining < 1.0:
+                # Always scale the uncovered effort, so repeating the same skills never shrinks a module twice
+                base_hours = module_base_hours(module)
+                module = {**module, "base_hours": base_hours, "estimated_hours": round(base_hours * remaining)}
+            modules.append(module)
+        if modules:
+            phases.append({**phase, "modules": modules})
+
+    return {**roadmap, "phases": phases}
+
+
+def module_hours(module: Dict[str, Any]) -> float:
+    """Estimated effort of a module, from its hours or its original week count"""
+    if module.get('estimated_hours'):
+        return float(module['estimated_hours'])
+    return float(module.get('duration_weeks', 1)) * WEEKLY_COMMITMENT_HOURS
+
+
+def module_base_hours(module: Dict[str, Any]) -> float:
+    """Effort of a module before any skill coverage was applied"""
+    if module.get('base_hours'):
+        return float(module['base_hours'])
+    if module.get('skill') in SKILL_HOURS:
+        return float(SKILL_HOURS[module['skill']])
+    return module_hours(module)
+
+
+def schedule_roadmap(roadmap: Dict[str, Any], timeframe_weeks: int, hours_per_week: float) -> Dict[str, Any]:
+    """Pack roadmap modules in order into weeks under the weekly hours budget"""
+    timeframe_weeks = max(1, int(timeframe_weeks))
+    hours_per_week = max(1.0, float(hours_per_week))
+
+    total_hours = sum(module_hours(module) for phase in roadmap.get('phases', []) for module in phase.get('modules', []))
+    budget = timeframe_weeks * hours_per_week
+    # Compress evenly when the plan does not fit the requested timeframe
+    scale = min(1.0, budget / total_hours) if total_hours else 1.0
+
+    elapsed = 0.0
+    phases = []
+    for phase in roadmap.get('phases', []):
+        phase_start = elapsed
+        modules = []
+        for module in phase.get('modules', []):
+            estimated_hours = module_hours(module)
+            hours = estimated_hours * scale
+            start_week = int(elapsed // hours_per_week) + 1
+            elapsed += hours
+            end_week = max(start_week, math.ceil(elapsed / hours_per_week - 1e-9))
+            # Keep the uncompressed effort, duration_weeks below only reflects this schedule
+            modules.append({
+                **module,
+                "estimated_hours": estimated_hours,
+                "scheduled_hours": round(hours, 1),
+                "start_week": start_week,
+                "end_week": end_week,
+                "duration_weeks": end_week - start_week + 1
+            })
+
+        phases.append({
+            **phase,
+            "start_week": int(phase_start // hours_per_week) + 1,
+            "duration_weeks": max(1, math.ceil((elapsed - phase_start) / hours_per_week - 1e-9)),
+            "modules": modules
+        })
+
+    return {
+        **roadmap,
+        "phases": phases,
+        "total_duration_weeks": max(1, math.ceil(elapsed / hours_per_week - 1e-9)) if elapsed else timeframe_weeks,
+        "timeframe_weeks": timeframe_weeks,
+        "weekly_commitment_hours": hours_per_week,
+        "required_weeks_at_pace": math.ceil(total_hours / hours_per_week) if total_hours else 0,
+        "compressed": scale < 1.0
+    }
+
+
+@app.route('/api/resources/search', methods=['GET'])
+def search_resources():
+    """Look up curated learning resources by skill, language and difficulty"""
+    try:
+        skill = request.args.get('skill', '')
+        if not skill:
+            return jsonify({'error': 'No skill provided'}), 400
+
+        resources = find_resources(
+            skill,
+            language=request.args.get('language'),
+            difficulty=request.args.get('difficulty'),
+            limit=request.args.get('limit', RESOURCES_PER_MODULE, type=int)
+        )
+
+        return jsonify({'skill': skill, 'resources': resources})
+
+    except Exception as e:
+        logger.error(f"Resource search failed: {str(e)}")
+        return jsonify({'error': 'Failed to search resources'}), 500
+
+
+def get_resource_catalog() -> Dict[str, List[Dict[str, Any]]]:
+    """Load the resource catalog once and index it by normalized skill"""
+    global resource_catalog
+    with resource_catalog_lock:
+        if resource_catalog is None:
+            index = {}
+            try:
+                with open(RESOURCE_CATALOG_PATH, encoding='utf-8') as catalog_file:
+                    for line in catalog_file:
+                        if not line.strip():
+                            continue
+                        entry = json.loads(line)
+                        index.setdefault(normalize_skill(entry['skill']), []).append(entry)
+                logger.info(f"Loaded resource catalog with {len(index)} skills")
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Resource catalog could not be loaded: {str(e)}")
+            resource_catalog = index
+        return resource_catalog
+
+
+def find_resources(skill: str, language: Optional[str] = None, difficulty: Optional[str] = None,
+                   limit: int = RESOURCES_PER_MODULE) -> List[Dict[str, Any]]:
+    """Top-ranked catalog resources for a skill, preferring the given language and difficulty"""
+    entries = get_resource_catalog().get(normalize_skill(skill), [])
+    language = normalize_skill(language) if language else None
+    difficulty = normalize_skill(difficulty) if difficulty else None
+
+    def score(entry):
+        entry_language = normalize_skill(entry['language']) if entry.get('language') else None
+        language_penalty = 1 if language and entry_language and entry_language != language else 0
+
+        entry_difficulty = entry.get('difficulty', 'all')
+        if not difficulty or entry_difficulty == difficulty:
+            difficulty_penalty = 0
+        elif entry_difficulty == 'all':
+            difficulty_penalty = 1
+        elif entry_difficulty in DIFFICULTY_LEVELS and difficulty in DIFFICULTY_LEVELS:
+            difficulty_penalty = 1 + abs(DIFFICULTY_LEVELS.index(entry_difficulty) - DIFFICULTY_LEVELS.index(difficulty))
+        else:
+            difficulty_penalty = 3
+
+        return language_penalty, difficulty_penalty, entry.get('rank', 1)
+
+    return [
+        {
+            "title": entry['title'],
+            "url": entry['url'],
+            "type": entry.get('type', 'tutorial'),
+            "free": entry.get('free', True),
+            "description": entry.get('description', '')
+        }
+        for entry in sorted(entries, key=score)[:max(0, limit)]
+    ]
+
+
+def attach_module_resources(roadmap: Dict[str, Any], experience_level: str, language: Optional[str]):
+    """Attach catalog resources to every roadmap module, preferring the plan's primary language"""
+    languages = {normalize_skill(lang) for config in CAREER_CONFIGS.values() for lang in config['languages']}
+    for phase in roadmap.get('phases', []):
+        for module in phase.get('modules', []):
+            skill = module.get('skill') or (module.get('technical_skills') or [''])[0]
+            module_language = skill if normalize_skill(skill) in languages else language
+            resources = find_resources(skill, language=module_language, difficulty=experience_level)
+            module['resources'] = resources or module.get('resources', [])
+
+
 @app.route('/api/dashboard/insights', methods=['POST'])
 def get_dashboard_insights():
-    """Generate AI-powered dashboard insights"""
+    """Generate dashboard insights from progress data"""
     try:
         data = request.get_json()
         user_id = data.get('user_id')
         user_profile = data.get('user_profile')
         progress_data = data.get('progress', {})
+        progress_delta = data.get('progress_delta')
+
+        with insights_store_lock:
+            stored = insights_store.get(user_id) if user_id else None
+
+        if progress_delta is not None:
+            if not stored:
+                return jsonify({
+                    "success": False,
+                    "error": "No stored progress for this user, send the full progress object"
+                }), 409
+            progress_data = merge_progress(stored['latest_progress'], progress_delta)
+
+        if stored and not insights_need_refresh(stored, user_profile, progress_data):
+            with insights_store_lock:
+                stored['latest_progress'] = progress_data
+            return jsonify({
+                "success": True,
+                "insights": stored['insights'],
+                "regenerated": False
+            })
 
-        insights = generate_ai_insights(user_profile, progress_data)
+        insights = generate_local_insights(user_profile, progress_data)
+
+        if user_id:
+            with insights_store_lock:
+                insights_store[user_id] = {
+                    'profile_fingerprint': fingerprint(user_profile),
+                    'progress_fingerprint': fingerprint(progress_data),
+                    'progress': progress_data,
+                    'latest_progress': progress_data,
+                    'insights': insights,
+                    'generated_at': time.time()
+                }
+                insights_store.move_to_end(user_id)
+                while len(insights_store) > INSIGHTS_STORE_SIZE:
+                    insights_store.popitem(last=False)
 
         return jsonify({
             "success": True,
-            "insights": insights
+            "insights": insights,
+            "regenerated": True
         })
 
     except Exception as e:
@@ -404,42 +1190,273 @@ def get_dashboard_insights():
         }), 500
 
 
-def generate_ai_insights(user_profile: Dict, progress_data: Dict) -> Dict[str, Any]:
-    """Generate personalized insights using OpenAI"""
+def fingerprint(data: Any) -> str:
+    """Stable content hash of a JSON-compatible value"""
+    if orjson is not None:
+        try:
+            return hashlib.sha256(orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)).hexdigest()
+        except TypeError:
+            pass
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def merge_progress(progress: Dict, delta: Dict) -> Dict:
+    """Apply a progress delta: nested dicts merge, other values replace, None removes the key"""
+    merged = dict(progress)
+    for key, value in delta.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_progress(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def completed_modules_value(progress: Dict) -> Any:
+    """Completed modules as reported by the client: a collection of module ids or a count"""
+    return progress.get('completed_modules', progress.get('modules_completed', 0))
+
+
+def count_completed_modules(progress: Dict) -> int:
+    """Number of completed modules reported in a progress object"""
+    completed = completed_modules_value(progress)
+    if isinstance(completed, (list, tuple, set, dict)):
+        return len(completed)
+    if isinstance(completed, (int, float)):
+        return int(completed)
+    return 0
+
+
+def numeric_progress_values(progress: Any, prefix: str = '') -> Dict[str, float]:
+    """Flatten the numeric leaves of a progress object into path -> value"""
+    values = {}
+    if isinstance(progress, dict):
+        for key, value in progress.items():
+            values.update(numeric_progress_values(value, f"{prefix}{key}."))
+    elif isinstance(progress, (int, float)) and not isinstance(progress, bool):
+        values[prefix.rstrip('.')] = float(progress)
+    return values
+
+
+def is_percentage_path(path: str) -> bool:
+    """Whether a flattened progress path holds a percentage or completion fraction"""
+    parts = path.lower().split('.')
+    if len(parts) > 1 and parts[0] in PERCENTAGE_PROGRESS_GROUPS:
+        return True
+    return parts[-1].endswith(PERCENTAGE_FIELD_SUFFIXES)
+
+
+def percentage_progress_values(progress: Dict) -> Dict[str, float]:
+    """Percentage fields of a progress object on a 0-100 scale"""
+    return {path: value for path, value in numeric_progress_values(progress).items() if is_percentage_path(path)}
+
+
+def progress_changed_materially(previous: Dict, current: Dict) -> bool:
+    """Whether progress moved past the configured module or percentage thresholds"""
+    if abs(count_completed_modules(current) - count_completed_modules(previous)) >= INSIGHTS_MODULES_DELTA:
+        return True
+
+    # Counters such as hours or timestamps are not percentages and never trigger a refresh here
+    previous_values = percentage_progress_values(previous)
+    current_values = percentage_progress_values(current)
+    for path in set(previous_values) | set(current_values):
+        previous_value = previous_values.get(path, 0.0)
+        current_value = current_values.get(path, 0.0)
+        # Rates and fractions reported on a 0-1 scale are compared as percentages
+        if path.lower().endswith(FRACTION_FIELD_SUFFIXES) and max(abs(previous_value), abs(current_value)) <= 1.0:
+            previous_value, current_value = previous_value * 100, current_value * 100
+        if abs(current_value - previous_value) >= INSIGHTS_PERCENT_DELTA:
+            return True
+
+    return False
+
+
+def insights_need_refresh(stored: Dict, user_profile: Dict, progress_data: Dict) -> bool:
+    """Decide whether stored insights are still valid for the given input"""
+    if stored['profile_fingerprint'] != fingerprint(user_profile):
+        return True
+    if time.time() - stored['generated_at'] > INSIGHTS_MAX_AGE_SECONDS:
+        return True
+    if stored['progress_fingerprint'] == fingerprint(progress_data):
+        return False
+    return progress_changed_materially(stored['progress'], progress_data)
+
+
+def generate_local_insights(user_profile: Dict, progress_data: Dict) -> Dict[str, Any]:
+    """Compute dashboard insights from progress data and the career configuration"""
     try:
+        user_profile = user_profile or {}
+        progress_data = progress_data or {}
         career = user_profile.get('career', 'fullstack')
         career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
 
-        prompt = f"""
-        Generate personalized learning insights and recommendations for a user pursuing a career as a {career_config['title']}.
+        metrics = compute_progress_metrics(user_profile, progress_data)
+        skill_focus = metrics['lagging_skills'][:3] or career_config['skills'][:3]
+        next_modules = recommend_next_modules(progress_data, skill_focus)
+
+        if metrics['pace_status'] == 'behind':
+            pace_text = f"about {metrics['weeks_behind']} weeks behind the {metrics['total_duration_weeks']}-week plan"
+        elif metrics['pace_status'] == 'ahead':
+            pace_text = f"ahead of the {metrics['total_duration_weeks']}-week plan"
+        else:
+            pace_text = f"on track with the {metrics['total_duration_weeks']}-week plan"
 
-        USER PROFILE:
-        - Career Target: {career_config['title']}
-        - Experience Level: {user_profile.get('experience', 'beginner')}
-        - Current Progress: {progress_data}
+        progress_analysis = (
+            f"You have completed {metrics['completed_modules']} of {metrics['total_modules']} modules "
+            f"({metrics['completion_rate']}%) toward {career_config['title']} and are {pace_text}."
+        )
+        if metrics['strongest_skills']:
+            progress_analysis += f" Your strongest areas are {', '.join(metrics['strongest_skills'])}."
+
+        recommendations = []
+        if metrics['pace_status'] == 'behind':
+            recommendations.append(
+                f"Add {metrics['extra_hours_per_week']} hours per week or extend your timeframe to catch up")
+        if skill_focus:
+            recommendations.append(f"Prioritize {skill_focus[0]}, it is your least developed core skill")
+        if metrics['completion_rate'] >= 50:
+            recommendations.append("Start a portfolio project that combines the skills you have learned")
+        else:
+            recommendations.append("Finish each module's exercises before moving on to keep fundamentals solid")
+        recommendations.append(f"Keep a steady {metrics['weekly_commitment_hours']} hours per week of practice")
+
+        next_steps = [f"Start module: {title}" for title in next_modules]
+        next_steps += [f"Practice {skill}" for skill in skill_focus]
+
+        return {
+            "progress_analysis": progress_analysis,
+            "recommendations": recommendations[:3],
+            "motivation": generate_motivation(career_config, metrics),
+            "skill_focus": skill_focus,
+            "next_steps": next_steps[:3],
+            "metrics": metrics
+        }
 
-        Provide:
-        1. PROGRESS_ANALYSIS: Analysis of current learning progress and strengths
-        2. RECOMMENDATIONS: Specific recommendations for next learning steps
-        3. MOTIVATION: Encouraging insights and motivation
-        4. SKILL_FOCUS: Key skills to focus on next
+    except Exception as e:
+        logger.error(f"Local insights generation failed: {str(e)}")
+        return generate_fallback_insights(user_profile)
 
-        Return ONLY valid JSON:
-        {{
-            "progress_analysis": "analysis of current progress",
-            "recommendations": [
-                "recommendation 1",
-                "recommendation 2", 
-                "recommendation 3"
-            ],
-            "motivation": "encouraging message",
-            "skill_focus": ["skill1", "skill2", "skill3"],
-            "next_steps": ["step1", "step2"]
-        }}
+
+def compute_progress_metrics(user_profile: Dict, progress_data: Dict) -> Dict[str, Any]:
+    """Completion rate, pace against the planned duration and per-skill standing"""
+    career = user_profile.get('career', 'fullstack')
+    career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
+
+    roadmap = progress_data.get('roadmap') or {}
+    roadmap_modules = [module for phase in roadmap.get('phases', []) for module in phase.get('modules', [])]
+
+    completed = count_completed_modules(progress_data)
+    # Without a roadmap, measure against the modules the career's plan would contain
+    total = (progress_data.get('total_modules') or len(roadmap_modules)
+             or sum(len(phase['modules']) for phase in build_roadmap_plan(career, [])['phases']))
+    completion_rate = min(100.0, completed / total * 100) if total else 0.0
+
+    total_weeks = (progress_data.get('total_duration_weeks') or roadmap.get('total_duration_weeks')
+                   or user_profile.get('total_duration_weeks') or 24)
+    weekly_hours = (progress_data.get('weekly_commitment_hours') or roadmap.get('weekly_commitment_hours')
+                    or user_profile.get('weekly_commitment_hours') or 15)
+
+    weeks_elapsed = progress_data.get('weeks_elapsed')
+    if weeks_elapsed is None and progress_data.get('started_at'):
+        try:
+            started_at = datetime.fromisoformat(str(progress_data['started_at']).replace('Z', '+00:00'))
+            now = datetime.now(started_at.tzinfo) if started_at.tzinfo else datetime.now()
+            weeks_elapsed = max(0.0, (now - started_at).days / 7)
+        except ValueError:
+            weeks_elapsed = None
+
+    # Pace compares actual completion with the share of the plan that has elapsed
+    expected_rate = min(100.0, weeks_elapsed / total_weeks * 100) if weeks_elapsed is not None else completion_rate
+    pace_gap = completion_rate - expected_rate
+    if pace_gap <= -10:
+        pace_status = 'behind'
+    elif pace_gap >= 10:
+        pace_status = 'ahead'
+    else:
+        pace_status = 'on_track'
+
+    weeks_behind = round(max(0.0, -pace_gap) / 100 * total_weeks, 1)
+    weeks_left = max(1.0, total_weeks - (weeks_elapsed or 0))
+    remaining_hours = (100 - completion_rate) / 100 * total_weeks * weekly_hours
+    extra_hours = max(0, round(remaining_hours / weeks_left - weekly_hours))
+
+    skill_progress = progress_data.get('skill_progress') or progress_data.get('skills') or {}
+    if not isinstance(skill_progress, dict):
+        skill_progress = {}
+    skill_levels = {skill: float(skill_progress.get(skill, 0) or 0) for skill in career_config['skills']}
+    ranked = sorted(skill_levels, key=lambda skill: skill_levels[skill])
+
+    return {
+        "completed_modules": completed,
+        "total_modules": total,
+        "completion_rate": round(completion_rate, 1),
+        "expected_completion_rate": round(expected_rate, 1),
+        "pace_status": pace_status,
+        "weeks_behind": weeks_behind,
+        "extra_hours_per_week": extra_hours,
+        "total_duration_weeks": total_weeks,
+        "weekly_commitment_hours": weekly_hours,
+        "lagging_skills": [skill for skill in ranked if skill_levels[skill] < 70],
+        "strongest_skills": [skill for skill in reversed(ranked) if skill_levels[skill] >= 70][:2],
+        "skill_levels": skill_levels
+    }
+
+
+def recommend_next_modules(progress_data: Dict, skill_focus: List[str]) -> List[str]:
+    """Next unfinished roadmap modules, preferring ones that cover the focus skills"""
+    roadmap = progress_data.get('roadmap') or {}
+    completed = completed_modules_value(progress_data)
+    completed_ids = set(completed) if isinstance(completed, (list, tuple, set, dict)) else set()
+
+    pending = [module for phase in roadmap.get('phases', []) for module in phase.get('modules', [])
+               if module.get('module_id') not in completed_ids]
+    if not completed_ids:
+        # A bare count means the first modules of the roadmap are done
+        pending = pending[count_completed_modules(progress_data):]
+
+    focus = {skill.lower() for skill in skill_focus}
+    pending.sort(key=lambda module: not focus & {skill.lower() for skill in module.get('technical_skills', [])})
+    return [module.get('title', module.get('module_id', '')) for module in pending[:2]]
+
+
+def generate_motivation(career_config: Dict, metrics: Dict) -> str:
+    """Motivation text, phrased by OpenAI when enabled and cached per progress bucket"""
+    completion_bucket = int(metrics['completion_rate'] // 10) * 10
+    default = {
+        'behind': f"You're {completion_bucket}% of the way to {career_config['title']}. A few focused sessions this week will get you back on track!",
+        'ahead': f"Great pace! You're already {completion_bucket}% of the way to {career_config['title']}. Keep the momentum going!",
+        'on_track': f"You're {completion_bucket}% of the way to {career_config['title']}. Keep going, every step brings you closer!"
+    }[metrics['pace_status']]
+
+    if not INSIGHTS_LLM_MOTIVATION:
+        return default
+
+    cache_key = make_cache_key('motivation', career_config['title'], completion_bucket, metrics['pace_status'])
+    cached = get_cached_payload(cache_key)
+    if cached:
+        return cached['data']
+
+    motivation = generate_ai_motivation(career_config, completion_bucket, metrics['pace_status'])
+    if not motivation:
+        return default
+
+    store_cached_payload(cache_key, motivation)
+    return motivation
+
+
+def generate_ai_motivation(career_config: Dict, completion_bucket: int, pace_status: str) -> Optional[str]:
+    """Phrase a short motivation message using OpenAI"""
+    try:
+        prompt = f"""
+        Write a short (1-2 sentences), encouraging message for a learner pursuing a career as a {career_config['title']}.
+        They have completed about {completion_bucket}% of their learning roadmap and are {pace_status.replace('_', ' ')} with their plan.
+
+        Return ONLY the message text.
         """
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        result_text = create_chat_completion(
+            'motivation',
             messages=[
                 {
                     "role": "system",
@@ -451,18 +1468,14 @@ def generate_ai_insights(user_profile: Dict, progress_data: Dict) -> Dict[str, A
                 }
             ],
             temperature=0.7,
-            max_tokens=1500
+            max_tokens=100
         )
 
-        result_text = response.choices[0].message.content.strip()
-        result_text = clean_json_response(result_text)
-        insights = json.loads(result_text)
-
-        return insights
+        return result_text.strip('"')
 
     except Exception as e:
-        logger.error(f"OpenAI insights generation failed: {str(e)}")
-        return generate_fallback_insights(user_profile)
+        logger.error(f"OpenAI motivation generation failed: {str(e)}")
+        return None
 
 
 @app.route('/api/jobs/match', methods=['POST'])
@@ -524,8 +1537,8 @@ def generate_ai_job_matches(skills: List, career: str, experience: str) -> List[
         Make it realistic for the current job market.
         """
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        result_text = create_chat_completion(
+            'job_matches',
             messages=[
                 {
                     "role": "system",
@@ -537,10 +1550,10 @@ def generate_ai_job_matches(skills: List, career: str, experience: str) -> List[
                 }
             ],
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=2000,
+            bucket=career_bucket(career)
         )
 
-        result_text = response.choices[0].message.content.strip()
         result_text = clean_json_response(result_text)
         jobs_data = json.loads(result_text)
 
@@ -560,19 +1573,35 @@ def generate_lesson():
         difficulty = data.get('difficulty', 'beginner')
         language = data.get('language', 'JavaScript')
 
+        if data.get('mode') == 'outline':
+            return generate_lesson_outline(topic, difficulty, language)
+
+        cache_key = make_cache_key('lesson', topic, difficulty, language)
+        cached = get_cached_payload(cache_key)
+        if cached:
+            return json_response(cached=cached)
+
         lesson_content = generate_ai_lesson(topic, difficulty, language)
 
-        return jsonify({
+        if not lesson_content:
+            lesson_content = generate_fallback_lesson(topic, language)
+            return json_response({
+                "success": True,
+                "lesson": lesson_content
+            })
+
+        cached = store_cached_payload(cache_key, {
             "success": True,
             "lesson": lesson_content
         })
+        return json_response(cached=cached)
 
     except Exception as e:
         logger.error(f"Lesson generation failed: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
-def generate_ai_lesson(topic: str, difficulty: str, language: str) -> Dict[str, Any]:
+def generate_ai_lesson(topic: str, difficulty: str, language: str) -> Optional[Dict[str, Any]]:
     """Generate learning lesson using OpenAI"""
     try:
         prompt = f"""
@@ -591,8 +1620,8 @@ def generate_ai_lesson(topic: str, difficulty: str, language: str) -> Dict[str,
         Return structured JSON content.
         """
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        result_text = create_chat_completion(
+            'lesson',
             messages=[
                 {
                     "role": "system",
@@ -604,10 +1633,10 @@ def generate_ai_lesson(topic: str, difficulty: str, language: str) -> Dict[str,
                 }
             ],
             temperature=0.3,
-            max_tokens=2500
+            max_tokens=2500,
+            bucket=level_bucket(difficulty)
         )
 
-        result_text = response.choices[0].message.content.strip()
         result_text = clean_json_response(result_text)
         lesson_data = json.loads(result_text)
 
@@ -615,37 +1644,387 @@ def generate_ai_lesson(topic: str, difficulty: str, language: str) -> Dict[str,
 
     except Exception as e:
         logger.error(f"OpenAI lesson generation failed: {str(e)}")
-        return generate_fallback_lesson(topic, language)
+        return None
+
+
+def generate_lesson_outline(topic: str, difficulty: str, language: str) -> Response:
+    """Serve a lesson outline and start generating its first section in the background"""
+    prefetch_lesson_section(topic, difficulty, language, LESSON_SECTIONS[0][0])
+
+    cache_key = make_cache_key('lesson_outline', topic, difficulty, language)
+    cached = get_cached_payload(cache_key)
+    if cached:
+        return json_response(cached=cached)
+
+    outline = generate_ai_lesson_outline(topic, difficulty, language)
+
+    if not outline:
+        return json_response({
+            "success": True,
+            "lesson": generate_fallback_lesson_outline(topic, language)
+        })
+
+    cached = store_cached_payload(cache_key, {
+        "success": True,
+        "lesson": outline
+    })
+    return json_response(cached=cached)
+
+
+@app.route('/api/learning/generate-section', methods=['POST'])
+def generate_lesson_section():
+    """Generate one lesson section on demand, prefetching the next one"""
+    try:
+        data = request.get_json()
+        topic = data.get('topic', 'Programming Basics')
+        difficulty = data.get('difficulty', 'beginner')
+        language = data.get('language', 'JavaScript')
+        section_id = data.get('section_id', LESSON_SECTIONS[0][0])
+
+        section_ids = [section[0] for section in LESSON_SECTIONS]
+        if section_id not in section_ids:
+            return jsonify({"error": f"Unknown section, expected one of: {', '.join(section_ids)}"}), 400
+
+        cache_key = make_cache_key('lesson_section', topic, difficulty, language, section_id)
+        cached = get_cached_payload(cache_key)
+        payload = None
+        if not cached:
+            payload = fetch_lesson_section(topic, difficulty, language, section_id)
+            cached = get_cached_payload(cache_key)
+
+        # Readers go top to bottom, so have the next section ready before it is asked for
+        position = section_ids.index(section_id)
+        if data.get('prefetch', True) and position + 1 < len(section_ids):
+            prefetch_lesson_section(topic, difficulty, language, section_ids[position + 1])
+
+        if cached:
+            return json_response(cached=cached)
+        return json_response(payload)
+
+    except Exception as e:
+        logger.error(f"Lesson section generation failed: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def claim_lesson_section(cache_key: str):
+    """Future for a section already in flight, or a new one the caller must complete"""
+    with lesson_sections_lock:
+        future = lesson_sections_in_flight.get(cache_key)
+        if future is not None:
+            return future, False
+        future = Future()
+        lesson_sections_in_flight[cache_key] = future
+        return future, True
+
+
+def complete_lesson_section(future: Future, cache_key: str, topic: str, difficulty: str, language: str,
+                            section_id: str):
+    """Build a claimed section into its future and release the claim"""
+    try:
+        future.set_result(build_lesson_section(cache_key, topic, difficulty, language, section_id))
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with lesson_sections_lock:
+            lesson_sections_in_flight.pop(cache_key, None)
+
+
+def fetch_lesson_section(topic: str, difficulty: str, language: str, section_id: str) -> Dict[str, Any]:
+    """Generate a section on the calling thread, or wait for a prefetch already generating it"""
+    cache_key = make_cache_key('lesson_section', topic, difficulty, language, section_id)
+    future, claimed = claim_lesson_section(cache_key)
+    if claimed:
+        complete_lesson_section(future, cache_key, topic, difficulty, language, section_id)
+        return future.result()
+
+    try:
+        return future.result(timeout=LESSON_SECTION_WAIT_SECONDS)
+    except FutureTimeoutError:
+        logger.warning(f"Lesson section {section_id} still generating after {LESSON_SECTION_WAIT_SECONDS:g}s")
+        return build_fallback_section_payload(topic, language, section_id)
+
+
+def prefetch_lesson_section(topic: str, difficulty: str, language: str, section_id: str):
+    """Generate a section in the background unless it is cached, in flight or every prefetch slot is busy"""
+    cache_key = make_cache_key('lesson_section', topic, difficulty, language, section_id)
+    if get_cached_payload(cache_key):
+        return
+    if not lesson_prefetch_slots.acquire(blocking=False):
+        logger.info(f"Skipping prefetch of lesson section {section_id}, all workers busy")
+        return
+
+    future, claimed = claim_lesson_section(cache_key)
+    if not claimed:
+        lesson_prefetch_slots.release()
+        return
+
+    def run():
+        try:
+            complete_lesson_section(future, cache_key, topic, difficulty, language, section_id)
+        finally:
+            lesson_prefetch_slots.release()
+
+    lesson_section_pool.submit(run)
+
+
+def next_lesson_section_id(section_id: str) -> Optional[str]:
+    """Section that follows section_id, None after the last one"""
+    section_ids = [section[0] for section in LESSON_SECTIONS]
+    position = section_ids.index(section_id)
+    return section_ids[position + 1] if position + 1 < len(section_ids) else None
+
+
+def build_fallback_section_payload(topic: str, language: str, section_id: str) -> Dict[str, Any]:
+    """Placeholder section payload, never cached"""
+    return {
+        "success": True,
+        "section": generate_fallback_lesson_section(topic, language, section_id),
+        "next_section_id": next_lesson_section_id(section_id)
+    }
+
+
+def build_lesson_section(cache_key: str, topic: str, difficulty: str, language: str, section_id: str) -> Dict[str, Any]:
+    """Generate a section and cache it, falling back to placeholder content without caching"""
+    section = generate_ai_lesson_section(topic, difficulty, language, section_id)
+    if not section:
+        return build_fallback_section_payload(topic, language, section_id)
+
+    payload = {
+        "success": True,
+        "section": section,
+        "next_section_id": next_lesson_section_id(section_id)
+    }
+    store_cached_payload(cache_key, payload)
+    return payload
+
+
+def generate_ai_lesson_outline(topic: str, difficulty: str, language: str) -> Optional[Dict[str, Any]]:
+    """Generate a short lesson outline and objectives using OpenAI"""
+    try:
+        sections_text = "\n".join(f"        - {section_id}: {title}" for section_id, title in LESSON_SECTIONS)
+
+        prompt = f"""
+        Create a short outline for a lesson about: {topic}
+        Programming Language: {language}
+        Difficulty Level: {difficulty}
+
+        The lesson has these sections, in this order:
+{sections_text}
+
+        Only outline the lesson, do not write the section content.
+
+        Return ONLY valid JSON:
+        {{
+            "title": "Lesson title",
+            "objectives": ["objective 1", "objective 2", "objective 3"],
+            "prerequisites": ["prerequisite 1"],
+            "estimated_minutes": 30,
+            "sections": {{
+                "theory": "One sentence on what this section covers"
+            }}
+        }}
+        """
+
+        result_text = create_chat_completion(
+            'lesson_outline',
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an expert programming instructor. Create engaging, educational content."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0.3,
+            max_tokens=400,
+            bucket=level_bucket(difficulty)
+        )
+
+        result_text = clean_json_response(result_text)
+        outline_data = json.loads(result_text)
+
+        summaries = outline_data.get('sections') or {}
+        if not isinstance(summaries, dict):
+            summaries = {}
+        outline_data['sections'] = [
+            {"section_id": section_id, "title": title, "summary": summaries.get(section_id, '')}
+            for section_id, title in LESSON_SECTIONS
+        ]
+
+        return outline_data
+
+    except Exception as e:
+        logger.error(f"OpenAI lesson outline generation failed: {str(e)}")
+        return None
+
+
+def generate_ai_lesson_section(topic: str, difficulty: str, language: str, section_id: str) -> Optional[Dict[str, Any]]:
+    """Generate a single lesson section using OpenAI"""
+    try:
+        section_title = dict(LESSON_SECTIONS)[section_id]
+
+        prompt = f"""
+        Write the "{section_title}" section of a lesson about: {topic}
+        Programming Language: {language}
+        Difficulty Level: {difficulty}
+
+        Write only this section, with examples in {language} where they help.
+
+        Return ONLY valid JSON:
+        {{
+            "title": "{section_title}",
+            "content": "Section text",
+            "examples": [
+                {{
+                    "code": "code in {language}",
+                    "explanation": "what the code shows"
+                }}
+            ],
+            "key_points": ["point 1", "point 2"]
+        }}
+        """
+
+        result_text = create_chat_completion(
+            'lesson_section',
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an expert programming instructor. Create engaging, educational content."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0.3,
+            max_tokens=800,
+            bucket=section_id
+        )
+
+        result_text = clean_json_response(result_text)
+        section_data = json.loads(result_text)
+        section_data['section_id'] = section_id
+
+        return section_data
+
+    except Exception as e:
+        logger.error(f"OpenAI lesson section generation failed: {str(e)}")
+        return None
 
 
 # Helper functions
+def create_chat_completion(endpoint: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                           bucket: Optional[str] = None) -> str:
+    """Call OpenAI with a learned max_tokens, expanding once if the output was cut off"""
+    limit = choose_max_tokens(endpoint, bucket, max_tokens)
+    started = time.time()
+
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=temperature,
+        max_tokens=limit,
+        request_timeout=OPENAI_REQUEST_TIMEOUT_SECONDS
+    )
+    finish_reason = response.choices[0].get('finish_reason')
+    truncated = finish_reason == 'length'
+    retried = False
+
+    if truncated and limit < MAX_COMPLETION_TOKENS:
+        retried = True
+        limit = min(MAX_COMPLETION_TOKENS, limit * 2)
+        logger.info(f"{endpoint} output was truncated, retrying with max_tokens={limit}")
+        response = openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=temperature,
+            max_tokens=limit,
+            request_timeout=OPENAI_REQUEST_TIMEOUT_SECONDS
+        )
+        finish_reason = response.choices[0].get('finish_reason')
+
+    usage = response.get('usage') or {}
+    record_completion(endpoint, bucket, usage.get('completion_tokens', limit), finish_reason, truncated, retried,
+                      time.time() - started)
+
+    return response.choices[0].message.content.strip()
+
+
+def choose_max_tokens(endpoint: str, bucket: Optional[str], default: int) -> int:
+    """High percentile of observed output length plus margin, or the default until enough samples exist"""
+    with completion_stats_lock:
+        for key in ([f"{endpoint}:{bucket}"] if bucket else []) + [endpoint]:
+            samples = completion_stats.get(key, {}).get('samples')
+            if samples and len(samples) >= ADAPTIVE_TOKENS_MIN_SAMPLES:
+                ordered = sorted(samples)
+                observed = ordered[min(len(ordered) - 1, int(len(ordered) * ADAPTIVE_TOKENS_PERCENTILE / 100))]
+                return max(MIN_COMPLETION_TOKENS, min(MAX_COMPLETION_TOKENS, math.ceil(observed * ADAPTIVE_TOKENS_MARGIN)))
+    return default
+
+
+def career_bucket(career: str) -> str:
+    """Stats bucket for a client-supplied career, limited to the known careers"""
+    return career if career in CAREER_CONFIGS else 'other'
+
+
+def level_bucket(level: str) -> str:
+    """Stats bucket for a client-supplied difficulty or experience level, limited to the known levels"""
+    level = str(level).strip().lower()
+    return level if level in DIFFICULTY_LEVELS else 'other'
+
+
+def record_completion(endpoint: str, bucket: Optional[str], completion_tokens: int, finish_reason: Optional[str],
+                      truncated: bool, retried: bool, latency: float):
+    """Record output length, truncation and latency for an endpoint and its bucket"""
+    with completion_stats_lock:
+        for key in ([f"{endpoint}:{bucket}"] if bucket else []) + [endpoint]:
+            stats = completion_stats.setdefault(key, {
+                'samples': deque(maxlen=ADAPTIVE_TOKENS_SAMPLE_SIZE),
+                'calls': 0,
+                'truncated': 0,
+                'failed_after_retry': 0,
+                'total_latency': 0.0
+            })
+            stats['samples'].append(completion_tokens)
+            stats['calls'] += 1
+            stats['truncated'] += int(truncated)
+            stats['failed_after_retry'] += int(retried and finish_reason == 'length')
+            stats['total_latency'] += latency
+
+
 def extract_text_from_file(file) -> str:
     """Extract text from uploaded file"""
-    text = ""
-    filename = file.filename.lower()
-
     try:
         file.seek(0)
+        return extract_text_from_bytes(file.filename, file.read())
 
-        if filename.endswith('.pdf'):
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages[:5]:  # Limit to first 5 pages
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+    except Exception as e:
+        logger.error(f"File extraction error: {str(e)}")
+        return "Sample CV content for AI analysis: Programming experience, project work, technical skills."
 
-        elif filename.endswith('.docx'):
-            doc = docx.Document(file)
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text += paragraph.text + "\n"
 
-        elif filename.endswith('.txt'):
-            text = file.read().decode('utf-8', errors='ignore')
+def extract_text_from_bytes(filename: str, content: bytes) -> str:
+    """Extract text from raw file content (picklable for the extraction process pool), raising on parse errors"""
+    text = ""
+    filename = filename.lower()
 
-    except Exception as e:
-        logger.error(f"File extraction error: {str(e)}")
-        text = "Sample CV content for AI analysis: Programming experience, project work, technical skills."
+    if filename.endswith('.pdf'):
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+        for page in pdf_reader.pages[:5]:  # Limit to first 5 pages
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+
+    elif filename.endswith('.docx'):
+        doc = docx.Document(io.BytesIO(content))
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                text += paragraph.text + "\n"
+
+    elif filename.endswith('.txt'):
+        text = content.decode('utf-8', errors='ignore')
 
     return text.strip()
 
@@ -666,6 +2045,106 @@ def clean_json_response(text: str) -> str:
     return text
 
 
+def serialize_json(data: Any) -> bytes:
+    """Serialize data to compact JSON bytes, using orjson when available"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Pick the best supported content encoding from an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        fields = part.strip().split(';')
+        name = fields[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return 'identity'
+
+
+def compress_payload(body: bytes, encoding: str) -> bytes:
+    """Compress serialized bytes with the given content encoding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def make_cache_key(namespace: str, *params: Any) -> str:
+    """Build a stable cache key from request parameters"""
+    digest = hashlib.sha256(serialize_json(list(params))).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def get_cached_payload(key: str) -> Optional[Dict[str, Any]]:
+    """Return a cached payload if present and not expired"""
+    with response_cache_lock:
+        cached = response_cache.get(key)
+        if not cached:
+            return None
+        if time.time() - cached['created_at'] > RESPONSE_CACHE_TTL_SECONDS:
+            del response_cache[key]
+            return None
+        response_cache.move_to_end(key)
+        return cached
+
+
+def store_cached_payload(key: str, data: Any) -> Dict[str, Any]:
+    """Serialize and precompress a result once, then cache it"""
+    body = serialize_json(data)
+    encoded = {}
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        for encoding in SUPPORTED_ENCODINGS:
+            encoded[encoding] = compress_payload(body, encoding)
+
+    cached = {'data': data, 'body': body, 'encoded': encoded, 'created_at': time.time()}
+    with response_cache_lock:
+        response_cache[key] = cached
+        response_cache.move_to_end(key)
+        while len(response_cache) > RESPONSE_CACHE_SIZE:
+            response_cache.popitem(last=False)
+    return cached
+
+
+def json_response(data: Any = None, status: int = 200, cached: Optional[Dict[str, Any]] = None) -> Response:
+    """Build a JSON response, compressed when the client accepts it and the body is large enough"""
+    body = cached['body'] if cached else serialize_json(data)
+
+    encoding = 'identity'
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+
+    if encoding != 'identity':
+        if cached and encoding in cached['encoded']:
+            body = cached['encoded'][encoding]
+        else:
+            body = compress_payload(body, encoding)
+
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
 def get_salary_range(career: str) -> str:
     """Get realistic salary range for career"""
     salary_ranges = {
@@ -728,46 +2207,30 @@ def generate_fallback_analysis(target_career: str) -> Dict[str, Any]:
     }
 
 
-def generate_fallback_roadmap(career: str, experience_level: str, user_name: str) -> Dict[str, Any]:
-    """Generate fallback roadmap when AI fails"""
+def generate_fallback_roadmap(career: str, experience_level: str, user_name: str,
+                              user_skills: Optional[List] = None) -> Dict[str, Any]:
+    """Generate fallback roadmap from the local plan and resource catalog when AI fails"""
     career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
+    plan = build_roadmap_plan(career, user_skills or [])
 
-    return {
+    content = {
         "overview": f"Comprehensive {career_config['title']} learning path for {user_name}",
-        "total_duration_weeks": 24,
-        "weekly_commitment_hours": 15,
         "readiness_score": 50,
-        "career": career,
-        "phases": [
-            {
-                "phase_id": "phase_1",
-                "title": f"{career_config['title']} Fundamentals",
-                "description": f"Build foundation in {career_config['title'].lower()} concepts and technologies",
-                "duration_weeks": 6,
-                "focus_areas": ["Core Concepts", "Essential Tools"],
-                "learning_objectives": ["Master fundamental concepts", "Learn essential development tools"],
-                "modules": [
-                    {
-                        "module_id": "module_1_1",
-                        "title": f"{career_config['languages'][0]} Programming",
-                        "description": f"Learn {career_config['languages'][0]} programming fundamentals",
-                        "duration_weeks": 3,
-                        "technical_skills": [career_config['languages'][0], "Programming Basics"],
-                        "learning_outcomes": [f"Write basic {career_config['languages'][0]} programs",
-                                              "Understand programming concepts"],
-                        "resources": [
-                            {
-                                "title": f"{career_config['languages'][0]} Documentation",
-                                "url": "https://developer.mozilla.org/",
-                                "type": "documentation",
-                                "free": True,
-                                "description": f"Official {career_config['languages'][0]} documentation"
-                            }
-                        ]
-                    }
-                ]
+        "phases": {
+            phase['phase_id']: {
+                "description": f"Build {career_config['title'].lower()} skills in {', '.join(phase['focus_areas'])}",
+                "learning_objectives": [f"Apply {skill} in practical projects" for skill in phase['focus_areas']]
             }
-        ],
+            for phase in plan['phases']
+        },
+        "modules": {
+            module['module_id']: {
+                "title": f"{module['skill']} Fundamentals",
+                "description": f"Learn {module['skill']} through hands-on exercises and a mini-project",
+                "learning_outcomes": [f"Use {module['skill']} confidently", f"Build a small project with {module['skill']}"]
+            }
+            for phase in plan['phases'] for module in phase['modules']
+        },
         "career_guidance": {
             "job_market_analysis": f"Strong demand for {career_config['title']} roles",
             "salary_expectations": get_salary_range(career),
@@ -776,6 +2239,11 @@ def generate_fallback_roadmap(career: str, experience_level: str, user_name: str
         }
     }
 
+    roadmap_data = apply_roadmap_content(plan, content)
+    attach_module_resources(roadmap_data, experience_level, primary_language(career, user_skills or []))
+    roadmap_data['career'] = career
+    return roadmap_data
+
 
 def generate_fallback_insights(user_profile: Dict) -> Dict[str, Any]:
     """Generate fallback insights"""
@@ -788,6 +2256,30 @@ def generate_fallback_insights(user_profile: Dict) -> Dict[str, Any]:
     }
 
 
+def generate_fallback_lesson_outline(topic: str, language: str) -> Dict[str, Any]:
+    """Generate fallback lesson outline"""
+    return {
+        "title": f"{topic} in {language}",
+        "objectives": [f"Understand {topic} concepts", f"Implement {topic} in {language}"],
+        "prerequisites": [],
+        "sections": [
+            {"section_id": section_id, "title": title, "summary": ""}
+            for section_id, title in LESSON_SECTIONS
+        ]
+    }
+
+
+def generate_fallback_lesson_section(topic: str, language: str, section_id: str) -> Dict[str, Any]:
+    """Generate fallback lesson section"""
+    return {
+        "section_id": section_id,
+        "title": dict(LESSON_SECTIONS)[section_id],
+        "content": f"Learn {topic} using {language} programming language.",
+        "examples": [{"code": f"// {language} example for {topic}", "explanation": ""}],
+        "key_points": [f"Practice implementing {topic} in {language}"]
+    }
+
+
 def generate_fallback_jobs(career: str, experience: str) -> List[Dict]:
     """Generate fallback job matches"""
     career_config = CAREER_CONFIGS.get(career, CAREER_CONFIGS['fullstack'])
@@ -825,9 +2317,14 @@ if __name__ == '__main__':
     print("✅ All endpoints ready with OpenAI integration:")
     print("   - /api/health")
     print("   - /api/careers/list")
+    print("   - /api/metrics/llm (OpenAI output-size statistics)")
     print("   - /api/skills/analyze (OpenAI CV Analysis)")
+    print("   - /api/skills/analyze-bulk (Bulk CV Analysis, NDJSON stream)")
     print("   - /api/ai/generate-roadmap (OpenAI Roadmap Generation)")
-    print("   - /api/dashboard/insights (OpenAI Insights)")
+    print("   - /api/ai/reschedule-roadmap (Local Roadmap Scheduling)")
+    print("   - /api/resources/search (Curated Learning Resources)")
+    print("   - /api/dashboard/insights (Local Insights, optional OpenAI motivation)")
     print("   - /api/jobs/match (OpenAI Job Matching)")
-    print("   - /api/learning/generate-lesson (OpenAI Lesson Generation)")
+    print("   - /api/learning/generate-lesson (OpenAI Lesson Generation, mode=outline for outline only)")
+    print("   - /api/learning/generate-section (OpenAI Lesson Section Generation)")
     app.run(debug=True, port=5000, threaded=True)
\ No newline at end of file